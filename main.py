@@ -4,23 +4,98 @@ import argparse
 import text
 import runtime
 import carla
-import random
 import time
 import math
 import shutil
-import csv
 import yaml
-from asq import query
+import numpy
+import cv2
+import queue
+import threading
+import collections
+import zlib
+from multiprocessing.shared_memory import SharedMemory
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from loguru import logger
 
+# libyaml based loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+# region Writers
+# raw layout of carla.RadarDetection, 4 x float32 per detection
+RADAR_CSV_HEADER = 'velocity,azimuth,altitude,depth\n'
+# %.9g round-trips float32 values
+RADAR_CSV_ROW_FORMAT = '%.9g,%.9g,%.9g,%.9g\n'
+# camera blueprints delivering carla.Image (BGRA)
+IMAGE_BLUEPRINT_IDS = ('sensor.camera.rgb', 'sensor.camera.depth', 'sensor.camera.semantic_segmentation', 'sensor.camera.instance_segmentation')
+# raw layout of carla.SemanticLidarDetection, 24 bytes per point
+SEMANTIC_LIDAR_DTYPE = numpy.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('CosAngle', '<f4'), ('ObjIdx', '<u4'), ('ObjTag', '<u4')])
+
+def pin_to_cpus(cpus: list):
+    # pool initializer, on Linux pid 0 is the calling thread, so writer threads and encoder processes are pinned individually
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+
+def write_image_shared(shm_name: str, shape: tuple, save_fullname: str, params: list):
+    # runs in an encoder process, reads the BGRA frame from the shared memory slot and drops the alpha plane
+    shm = SharedMemory(name=shm_name)
+    try:
+        written = cv2.imwrite(save_fullname, numpy.ndarray(shape, dtype=numpy.uint8, buffer=shm.buf)[:, :, :3], params)
+    finally:
+        shm.close()
+    if not written:
+        raise IOError(f'cv2 could not write image to [{save_fullname}]')
+
+def write_lidar_ply(points: numpy.ndarray, save_fullname: str):
+    # binary little endian PLY, same vertex properties as CARLA's ASCII export
+    header = f'ply\nformat binary_little_endian 1.0\nelement vertex {len(points)}\nproperty float32 x\nproperty float32 y\nproperty float32 z\nproperty float32 I\nend_header\n'
+    with open(save_fullname, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(points.astype('<f4', copy=False))
+
+def write_semantic_lidar_ply(points: numpy.ndarray, save_fullname: str):
+    # binary little endian PLY, same vertex properties as CARLA's ASCII export of the semantic LiDAR
+    header = f'ply\nformat binary_little_endian 1.0\nelement vertex {len(points)}\nproperty float32 x\nproperty float32 y\nproperty float32 z\nproperty float32 CosAngle\nproperty uint32 ObjIdx\nproperty uint32 ObjTag\nend_header\n'
+    with open(save_fullname, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(points)
+
+def write_radar_csv(detections: numpy.ndarray, save_fullname: str):
+    # formats the whole frame in one call, numpy.savetxt would format row by row in Python
+    body = (RADAR_CSV_ROW_FORMAT * len(detections)) % tuple(detections.ravel().tolist())
+    # encoded once, written as bytes
+    with open(save_fullname, 'wb') as f:
+        f.write((RADAR_CSV_HEADER + body).encode('ascii'))
+
+def move_staged_output(staging_dir: str, output_dir: str, logger_header: str = ''):
+    # runs on a background thread, the sensor folders are moved one by one next to the already written meta.yaml
+    try:
+        for entry in os.listdir(staging_dir):
+            shutil.move(os.path.join(staging_dir, entry), os.path.join(output_dir, entry))
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        logger.success(f'{logger_header}Staged output moved to: [{output_dir}]')
+    except Exception as e:
+        logger.error(f'{logger_header}Move staged output [{staging_dir}] failure: [{e}]')
+# endregion
+
 # region Classes
 class ScenarioInfo:
+    __slots__ = ('name', 'record_path', 'time_start', 'time_end', 'ego_vehicle_actor_id', 'world_name')
+
     def __init__(self, name, path, t_start, t_end, ego_actor_id) -> None:
         self.name = name
         self.record_path = os.path.join(runtime.app_root_path, os.path.abspath(path))
         self.time_start = t_start
         self.time_end = t_end
         self.ego_vehicle_actor_id = ego_actor_id
+        # map of the record file, resolved once by the loader, None when the CARLA server was not reachable
+        self.world_name = None
 
 class ScenarioInfoYamlLoader:
     def __init__(self) -> None:
@@ -34,112 +109,304 @@ class ScenarioInfoYamlLoader:
             logger.error(f'{self.logger_header}Input Error: ScenarioInfo file [{yaml_file_abspath}] not exists.')
             exit(1)
         # exec load
-        with open(yaml_file_abspath, 'r', encoding='utf8') as f:
-            yaml_data = yaml.load(f, Loader=yaml.FullLoader)
+        with open(yaml_file_abspath, 'rb') as f:
+            yaml_data = yaml.load(f, Loader=YamlLoader)
         # decode yaml file
         for d in yaml_data:
             info = ScenarioInfo(d['name'], d['record_file'], d['time']['start'], d['time']['end'], d['ego_vehicle_actor_id'])
-            logger.debug(f'{self.logger_header}{info.name}/record_path: [{info.record_path}]')
-            logger.debug(f'{self.logger_header}{info.name}/time_start: [{info.time_start}]')
-            logger.debug(f'{self.logger_header}{info.name}/time_end: [{info.time_end}]')
-            logger.debug(f'{self.logger_header}{info.name}/ego_vehicle_actor_id: [{info.ego_vehicle_actor_id}]')
+            logger.debug('{}{}/record_path: [{}]', self.logger_header, info.name, info.record_path)
+            logger.debug('{}{}/time_start: [{}]', self.logger_header, info.name, info.time_start)
+            logger.debug('{}{}/time_end: [{}]', self.logger_header, info.name, info.time_end)
+            logger.debug('{}{}/ego_vehicle_actor_id: [{}]', self.logger_header, info.name, info.ego_vehicle_actor_id)
             scenario_list.append(info)
             logger.success(f'{self.logger_header}Successfully loading scenario: [{info.name}]')
+        self._resolve_world_names(scenario_list)
         return scenario_list
 
+    def _resolve_world_names(self, scenario_list: list):
+        # one query per record file for the whole run, the infos are handed to every job and worker
+        try:
+            client = carla.Client(runtime.carla_ip_addr, runtime.carla_port)
+            client.set_timeout(runtime.carla_client_timeout)
+            world_names = dict()
+            for info in scenario_list:
+                if info.record_path not in world_names:
+                    try:
+                        world_names[info.record_path] = read_record_world_name(client, info.record_path)
+                    except IndexError:
+                        # missing or unreadable record, the server answers with a single message line
+                        logger.warning(f'{self.logger_header}Resolve map of record [{info.record_path}] failure, it is resolved by each job')
+                        world_names[info.record_path] = None
+                info.world_name = world_names[info.record_path]
+                logger.debug('{}{}/world_name: [{}]', self.logger_header, info.name, info.world_name)
+        except RuntimeError as e:
+            logger.warning(f'{self.logger_header}Resolve scenario maps failure, maps are resolved by each job: [{e}]')
+
 class SensorInfo:
+    __slots__ = ('blueprint_name', 'transform', 'attribute')
+
     def __init__(self, blueprint_name, transform=carla.Transform) -> None:
         self.blueprint_name = blueprint_name
         self.transform = transform
         self.attribute = dict()
 
+class SharedFrameBuffer:
+    __slots__ = ('shm', 'size', 'nbytes')
+
+    def __init__(self, size: int) -> None:
+        # named shared memory, any process can attach to the payload by name without serialization
+        self.shm = SharedMemory(create=True, size=max(size, 1))
+        self.size = size
+        self.nbytes = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def view(self) -> numpy.ndarray:
+        return numpy.ndarray((self.nbytes,), dtype=numpy.uint8, buffer=self.shm.buf)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+class BufferPool:
+    def __init__(self, slot_bytes: int, slot_count: int, logger_header: str = '') -> None:
+        self.slot_bytes = slot_bytes
+        self.slot_count = slot_count
+        self.logger_header = logger_header
+        self._free = collections.deque(SharedFrameBuffer(slot_bytes) for _ in range(slot_count))
+        # at most slot_count frames are in flight, this bounds the writer backlog
+        self._in_flight = threading.BoundedSemaphore(slot_count)
+
+    def copy_from(self, raw_data) -> SharedFrameBuffer:
+        # pass the returned slot back with release() once it is written
+        if not self._in_flight.acquire(blocking=False):
+            # the simulation runs synchronously, so waiting here holds the world instead of dropping frames
+            logger.warning(f'{self.logger_header}All [{self.slot_count}] frame buffers are waiting for the disk, wait for the writers')
+            self._in_flight.acquire()
+        source = numpy.frombuffer(raw_data, dtype=numpy.uint8)
+        slot = None
+        if source.size <= self.slot_bytes:
+            try:
+                slot = self._free.popleft()
+            except IndexError:
+                pass
+        if slot is None:
+            # frame larger than a slot, fall back to a one-off buffer
+            slot = SharedFrameBuffer(max(source.size, self.slot_bytes))
+        slot.nbytes = source.size
+        slot.view()[:] = source
+        return slot
+
+    def release(self, slot: SharedFrameBuffer):
+        if slot.size == self.slot_bytes and len(self._free) < self.slot_count:
+            self._free.append(slot)
+        else:
+            slot.close()
+        self._in_flight.release()
+
+    def close(self):
+        # wait until every frame in flight is released by its writer, then free the slots
+        for _ in range(self.slot_count):
+            self._in_flight.acquire()
+        while self._free:
+            self._free.popleft().close()
+
 class Sensor:
-    def __init__(self, info: SensorInfo, seq_id: int, job_log_header: str, world: carla.World, target: carla.Actor, output_dir) -> None:
+    def __init__(self, info: SensorInfo, seq_id: int, job_log_header: str, blueprint_library: carla.BlueprintLibrary, target: carla.Actor, output_dir, writer: ThreadPoolExecutor, encoder: ProcessPoolExecutor, blueprint_cache: dict = None) -> None:
         self.sensor_info = info
         self.seq_id = seq_id
         self.logger_header = job_log_header
-        self._is_recording = False
         self.sensor_actor = None
-        self.world = world
+        self.blueprint_library = blueprint_library
+        # configured blueprints shared by the sensors of a job, keyed by blueprint name and attributes
+        self.blueprint_cache = blueprint_cache if blueprint_cache is not None else dict()
         self.vehicle_actor = target
-        self.output_directory_path = output_dir
-        self.record_counter_target = 0
-        self.record_counter_current = 0
-
-    def record_this(self):
-        self.record_counter_target += 1
-        logger.debug(f'{self.logger_header} received <record this> cmd, target: [{self.record_counter_target}]')
-
+        self.output_directory_path = None
+        self.save_directory_path = None
+        self._save_prefix = None
+        self.set_output_directory(output_dir)
+        self.writer = writer
+        self.encoder = encoder
+        # filled directly by the CARLA receive thread, drained by the job after every tick
+        self.data_queue = queue.Queue()
+        self.buffer_pool = None
+        # frame independent values, specialized once in spawn()
+        self.save_handler = None
+        self._image_shape = None
+        self._image_ext = None
+        self._image_params = None
+
+    def _save_image(self, data):
+        save_fullname = f'{self._save_prefix}{data.frame}.{self._image_ext}'
+        # positional args are only formatted when a sink accepts DEBUG
+        logger.debug('{}Sensor [{}] is saving image data to: [{}]', self.logger_header, self.seq_id, save_fullname)
+        slot = self.buffer_pool.copy_from(data.raw_data)
+        # image encoding is CPU bound, encode in another process to get around the GIL, cv2 picks the codec by extension
+        try:
+            future = self.encoder.submit(write_image_shared, slot.name, self._image_shape, save_fullname, self._image_params)
+        except Exception:
+            # a broken pool never calls back, the slot is released here so clean() does not wait for it
+            self.buffer_pool.release(slot)
+            raise
+        future.add_done_callback(lambda f: self._encode_done_callback(f, slot))
+
+    def _save_lidar(self, data):
+        save_fullname = f'{self._save_prefix}{data.frame}.ply'
+        slot = self.buffer_pool.copy_from(data.raw_data)
+        logger.debug('{}Sensor [{}] is saving pointcloud(ply) data to: [{}]', self.logger_header, self.seq_id, save_fullname)
+        self._submit(self._write_lidar_ply, slot, save_fullname)
+
+    def _save_semantic_lidar(self, data):
+        save_fullname = f'{self._save_prefix}{data.frame}.ply'
+        slot = self.buffer_pool.copy_from(data.raw_data)
+        logger.debug('{}Sensor [{}] is saving semantic pointcloud(ply) data to: [{}]', self.logger_header, self.seq_id, save_fullname)
+        self._submit(self._write_semantic_lidar_ply, slot, save_fullname)
+
+    def _save_radar(self, data):
+        save_fullname = f'{self._save_prefix}{data.frame}.csv'
+        slot = self.buffer_pool.copy_from(data.raw_data)
+        logger.debug('{}Sensor [{}] is saving radar(csv) data to: [{}]', self.logger_header, self.seq_id, save_fullname)
+        self._submit(self._write_radar_csv, slot, save_fullname)
+
+    def _submit(self, fn, slot, save_fullname):
+        try:
+            future = self.writer.submit(fn, slot, save_fullname)
+        except Exception:
+            self.buffer_pool.release(slot)
+            raise
+        future.add_done_callback(self._write_done_callback)
+
+    def _write_done_callback(self, future):
+        if future.exception() is not None:
+            logger.error(f'{self.logger_header}Sensor [{self.seq_id}] write failure: [{future.exception()}]')
+
+    def _encode_done_callback(self, future, slot):
+        self.buffer_pool.release(slot)
+        self._write_done_callback(future)
+
+    def _write_lidar_ply(self, slot, save_fullname):
+        try:
+            write_lidar_ply(slot.view().view(numpy.float32).reshape((-1, 4)), save_fullname)
+        finally:
+            self.buffer_pool.release(slot)
+
+    def _write_semantic_lidar_ply(self, slot, save_fullname):
+        try:
+            write_semantic_lidar_ply(slot.view().view(SEMANTIC_LIDAR_DTYPE), save_fullname)
+        finally:
+            self.buffer_pool.release(slot)
+
+    def _write_radar_csv(self, slot, save_fullname):
+        try:
+            write_radar_csv(slot.view().view(numpy.float32).reshape((-1, 4)), save_fullname)
+        finally:
+            self.buffer_pool.release(slot)
+
+    def _specialize(self, sensor_bp):
+        # the data type and layout are fixed by the blueprint, resolve everything once instead of per frame
+        frame_bytes = 0
+        if sensor_bp.id in IMAGE_BLUEPRINT_IDS:
+            self.save_handler = self._save_image
+            self._image_shape = (sensor_bp.get_attribute('image_size_y').as_int(), sensor_bp.get_attribute('image_size_x').as_int(), 4)
+            # only RGB may be lossy, depth and segmentation images encode values in their pixels
+            if runtime.io_image_format == 'jpg' and sensor_bp.id == 'sensor.camera.rgb':
+                self._image_ext = 'jpg'
+                self._image_params = [cv2.IMWRITE_JPEG_QUALITY, runtime.io_jpeg_quality]
+            else:
+                self._image_ext = 'png'
+                self._image_params = [cv2.IMWRITE_PNG_COMPRESSION, runtime.io_png_compression]
+            frame_bytes = self._image_shape[0] * self._image_shape[1] * self._image_shape[2]
+        elif sensor_bp.id == 'sensor.lidar.ray_cast':
+            self.save_handler = self._save_lidar
+            # 4 x float32 per point (x, y, z, intensity), points_per_second spread over the simulation steps
+            frame_bytes = int(sensor_bp.get_attribute('points_per_second').as_int() * runtime.carla_fixed_delta_time + 1) * 16
+        elif sensor_bp.id == 'sensor.lidar.ray_cast_semantic':
+            self.save_handler = self._save_semantic_lidar
+            frame_bytes = int(sensor_bp.get_attribute('points_per_second').as_int() * runtime.carla_fixed_delta_time + 1) * SEMANTIC_LIDAR_DTYPE.itemsize
+        elif sensor_bp.id == 'sensor.other.radar':
+            self.save_handler = self._save_radar
+            # 4 x float32 per detection, at most points_per_second spread over the simulation steps
+            frame_bytes = int(sensor_bp.get_attribute('points_per_second').as_int() * runtime.carla_fixed_delta_time + 1) * 16
+        else:
+            logger.warning(f'{self.logger_header}Sensor [{self.seq_id}] has no data handler for [{sensor_bp.id}], its data will not be recorded')
+        # recycled buffers for frame payloads, CARLA's own buffers are released right after the copy
+        self.buffer_pool = BufferPool(frame_bytes, runtime.io_buffer_pool_slots, f'{self.logger_header}Sensor [{self.seq_id}] ')
 
-    def _data_callback(self, data):
-        if not self._is_recording:
-            return
-        if self.record_counter_current >= self.record_counter_target:
-            return
-        self.record_counter_current += 1
-        save_path = os.path.join(self.output_directory_path, str(self.seq_id))
-        if isinstance(data, carla.Image):
-            save_fullname = os.path.join(save_path, f'{data.frame}.png' )
-            logger.debug(f'{self.logger_header}Sensor [{self.seq_id}] is saving image data to: [{save_fullname}]')
-            data.save_to_disk(save_fullname)
-        if isinstance(data, carla.LidarMeasurement):
-            save_fullname = os.path.join(save_path, f'{data.frame}.ply' )
-            logger.debug(f'{self.logger_header}Sensor [{self.seq_id}] is saving pointcloud(ply) data to: [{save_fullname}]')
-            data.save_to_disk(save_fullname)
-        if isinstance(data, carla.RadarMeasurement):
-            save_fullname = os.path.join(save_path, f'{data.frame}.csv' )
-            csv_headers = ['velocity', 'azimuth', 'altitude', 'depth']
-            csv_rows = list()
-            for d in data:
-                csv_rows.append((d.velocity, d.azimuth, d.altitude, d.depth))
-            if not os.path.exists(save_path):
-                os.makedirs(save_path)
-            with open(save_fullname, 'w', encoding='utf8', newline='') as f:
-                w = csv.writer(f)
-                w.writerow(csv_headers)
-                w.writerows(csv_rows)
-            logger.debug(f'{self.logger_header}Sensor [{self.seq_id}] is saving radar(csv) data to: [{save_fullname}]')
-    
-    def spawn(self):
-         # get blueprint
-        sensor_bp = self.world.get_blueprint_library().find(self.sensor_info.blueprint_name)
+    def _configure_blueprint(self):
+        # get blueprint
+        sensor_bp = self.blueprint_library.find(self.sensor_info.blueprint_name)
         logger.info(f'{self.logger_header}Sensor [{self.seq_id}] blueprint set to: [{sensor_bp.id}]')
-        # get transform
-        sensor_tf = self.sensor_info.transform
-        logger.info(f'{self.logger_header}Sensor [{self.seq_id}] transform set to: [({sensor_tf.location.x}, {sensor_tf.location.y}, {sensor_tf.location.z}, '+
-                    f'{sensor_tf.rotation.pitch}, {sensor_tf.rotation.yaw}, {sensor_tf.rotation.roll})]')
         # get attributes
+        # keys and values are already strings, converted by JobYamlLoader
         for (attr_key, attr_value) in self.sensor_info.attribute.items():
-            try:
-                sensor_bp.set_attribute(str(attr_key), str(attr_value))
-                logger.info(f'{self.logger_header}Sensor [{self.seq_id}] set attribute as key:[{attr_key}], value:[{str(attr_value)}]')
-            except IndexError:
+            if sensor_bp.has_attribute(attr_key):
+                sensor_bp.set_attribute(attr_key, attr_value)
+            else:
                 logger.error(f'{self.logger_header}Sensor [{self.seq_id}] set attribute failure with no key found:[{attr_key}]')
+        logger.info(f'{self.logger_header}Sensor [{self.seq_id}] set attributes as: [{self.sensor_info.attribute}]')
+        # the frame barrier needs data of every capture tick, a sensor may not skip simulation steps
+        if sensor_bp.has_attribute('sensor_tick') and sensor_bp.get_attribute('sensor_tick').as_float() != 0.0:
+            logger.warning(f'{self.logger_header}Sensor [{self.seq_id}] attribute [sensor_tick] is not supported and reset to: [0.0]')
+            sensor_bp.set_attribute('sensor_tick', '0.0')
         # addition static attributes
         if sensor_bp.id == 'sensor.lidar.ray_cast':
             sensor_bp.set_attribute('points_per_second', str(1280000))
             sensor_bp.set_attribute('rotation_frequency', str(100))
-        # spawn actor
-        self.sensor_actor = self.world.spawn_actor(sensor_bp, sensor_tf, attach_to=self.vehicle_actor)
-        self.sensor_actor.listen(lambda data: self._data_callback(data))
+        return sensor_bp
 
-    def start_recording(self):
-        logger.info(f'{self.logger_header}Sensor [{self.seq_id}] starts recording')
-        self._is_recording = True
+    def set_output_directory(self, output_dir):
+        self.output_directory_path = output_dir
+        self.save_directory_path = os.path.join(output_dir, str(self.seq_id))
+        # trailing separator, file names are appended per frame without os.path.join
+        self._save_prefix = os.path.join(self.save_directory_path, '')
+
+    def prepare(self):
+        # resolves blueprint and transform, the job spawns the sensors of all Sensor objects in one batch
+        # identical sensor configurations reuse the configured blueprint, the spawn command copies it to the server
+        cache_key = (self.sensor_info.blueprint_name, tuple(sorted(self.sensor_info.attribute.items())))
+        sensor_bp = self.blueprint_cache.get(cache_key)
+        if sensor_bp is None:
+            sensor_bp = self._configure_blueprint()
+            self.blueprint_cache[cache_key] = sensor_bp
+        else:
+            logger.info(f'{self.logger_header}Sensor [{self.seq_id}] reuses configured blueprint: [{sensor_bp.id}]')
+        # get transform
+        sensor_tf = self.sensor_info.transform
+        logger.info(f'{self.logger_header}Sensor [{self.seq_id}] transform set to: [({sensor_tf.location.x}, {sensor_tf.location.y}, {sensor_tf.location.z}, '+
+                    f'{sensor_tf.rotation.pitch}, {sensor_tf.rotation.yaw}, {sensor_tf.rotation.roll})]')
+        self._specialize(sensor_bp)
+        return carla.command.SpawnActor(sensor_bp, sensor_tf, self.vehicle_actor.id)
 
-    def stop_recording(self):
-        logger.info(f'{self.logger_header}Sensor [{self.seq_id}] stopped recording')
-        self._is_recording = False
+    def attach(self, sensor_actor: carla.Actor):
+        self.sensor_actor = sensor_actor
+        # sensors without handler are not listened to, the job does not wait for them either
+        if self.save_handler is not None:
+            self.sensor_actor.listen(self.data_queue.put)
+
+# record file the map of each CARLA server was last loaded for by this process, keyed by (ip, port)
+_loaded_record_paths = dict()
+# encoder processes shared by all jobs of this process, started with the first job, see get_shared_encoder()
+_shared_encoder = None
 
 class Job:
-    def __init__(self, job_name: str, sensor_infos: list) -> None:
+    def __init__(self, job_name: str, sensor_infos: list, config_path: str = None) -> None:
         self.name = job_name
+        self.config_path = config_path
         self.client = None
         self.world = None
+        self.blueprint_library = None
+        self.world_settings = None
         self.vehicle_actor = None
+        self.writer = None
+        self.encoder = None
+        self.blueprint_cache = dict()
         self.sensor_objs = list()
         self.sensor_infos = sensor_infos
         self._scenario_info = None
+        self._staging_directory_path = None
+        self._staging_mover = None
 
     @property
     def output_directory_path(self):
@@ -149,6 +416,11 @@ class Job:
     def scenario_info(self) -> ScenarioInfo:
         return self._scenario_info
     
+    @property
+    def random_seed(self) -> int:
+        # stable across runs and processes, unlike hash() on str
+        return zlib.crc32(f'{runtime.carla_sim_random_seed}/{self.name}/{self.scenario_info.name}'.encode('utf8'))
+
     @property
     def logger_header(self):
         if self._scenario_info:
@@ -166,30 +438,76 @@ class Job:
         logger.info(f'{self.logger_header}Output directory set to: [{self.output_directory_path}]')
         if os.path.exists(self.output_directory_path) and os.path.isdir(self.output_directory_path):
             logger.warning(f'{self.logger_header}Output directory [{self.output_directory_path}] already exist, old ones will be deleted')
-            shutil.rmtree(self.output_directory_path)
-        os.makedirs(self.output_directory_path)
+            # rename is constant time next to the original, the files are deleted while the world loads
+            scratch_path = f'{self.output_directory_path}.old.{os.getpid()}.{time.time_ns()}'
+            try:
+                os.rename(self.output_directory_path, scratch_path)
+                threading.Thread(target=shutil.rmtree, args=(scratch_path,), kwargs={'ignore_errors': True}, name=f'cleaner-{self.name}').start()
+            except OSError:
+                shutil.rmtree(self.output_directory_path)
+        os.makedirs(self.output_directory_path, exist_ok=True)
         logger.info(f'{self.logger_header}Output directory [{self.output_directory_path}] cureated complete')
 
         # connect to carla
         self.client = carla.Client(runtime.carla_ip_addr, runtime.carla_port)
-
-        # decode scenario file and load new world
-        world_name = self.client.show_recorder_file_info(self.scenario_info.record_path, False).splitlines()[1].replace('Map: ', '')
-        logger.info(f'{self.logger_header}Load map[{world_name}] by sceanrio: [{self.scenario_info.name}]')
-        self.world = self.client.load_world(world_name)
+        self.client.set_timeout(runtime.carla_client_timeout)
+        logger.info(f'{self.logger_header}Connected to CARLA server [{runtime.carla_ip_addr}:{runtime.carla_port}] with timeout: [{runtime.carla_client_timeout}]')
+
+        # decode scenario file and load new world, the replayer reuses the actors left by the same record file
+        server_key = (runtime.carla_ip_addr, runtime.carla_port)
+        if _loaded_record_paths.get(server_key) == self.scenario_info.record_path:
+            logger.info(f'{self.logger_header}Reuse loaded map by sceanrio: [{self.scenario_info.name}]')
+            self.world = self.client.get_world()
+        else:
+            if self.scenario_info.world_name is None:
+                self.scenario_info.world_name = read_record_world_name(self.client, self.scenario_info.record_path)
+            world_name = self.scenario_info.world_name
+            logger.info(f'{self.logger_header}Load map[{world_name}] by sceanrio: [{self.scenario_info.name}]')
+            _loaded_record_paths.pop(server_key, None)
+            self.world = self.client.load_world(world_name)
+            _loaded_record_paths[server_key] = self.scenario_info.record_path
+        self.blueprint_library = self.world.get_blueprint_library()
+        self.world_settings = self.world.get_settings()
+        self._enter_sync_mode()
 
         # spawn scenario actors
         self.client.replay_file(self.scenario_info.record_path, 0.0, 0.3, self.scenario_info.ego_vehicle_actor_id, False)
+        self.world.tick()
         self.vehicle_actor = self.world.get_actor(self.scenario_info.ego_vehicle_actor_id)
 
-        # spawn sensors
+        # start the writer threads of this job, the encoder processes are shared with the other jobs
+        self.writer = ThreadPoolExecutor(max_workers=runtime.io_writer_max_workers, thread_name_prefix=f'writer-{self.name}', initializer=pin_to_cpus, initargs=(runtime.io_writer_cpus,))
+        self.encoder = get_shared_encoder()
+
+        # spawn sensors, one round trip for all sensors of the job
+        spawn_commands = list()
         sensor_counter = 0
         for sensor_info in self.sensor_infos:
             logger.info(f'{self.logger_header}Decoding sensor [{sensor_counter}]')
-            sensor_obj = Sensor(sensor_info, sensor_counter, self.logger_header, self.world, self.vehicle_actor, self.output_directory_path)
-            sensor_obj.spawn()
+            sensor_obj = Sensor(sensor_info, sensor_counter, self.logger_header, self.blueprint_library, self.vehicle_actor, self.output_directory_path, self.writer, self.encoder, self.blueprint_cache)
+            # registered before prepare() so clean() also frees the buffers of a sensor that failed to prepare
             self.sensor_objs.append(sensor_obj)
+            spawn_commands.append(sensor_obj.prepare())
             sensor_counter += 1
+        # the frame sizes are known once the sensors are prepared, staging is decided on the raw size of the scenario
+        self._setup_staging(sum(s.buffer_pool.slot_bytes for s in self.sensor_objs) * runtime.carla_sim_max_count)
+        for s in self.sensor_objs:
+            if self._staging_directory_path is not None:
+                s.set_output_directory(self._staging_directory_path)
+            # create output folder, keeps os.makedirs off the data callback
+            os.makedirs(s.save_directory_path, exist_ok=True)
+        # responses are in command order, so they match the sensor seq ids
+        responses = self.client.apply_batch_sync(spawn_commands, False)
+        for (sensor_obj, response) in zip(self.sensor_objs, responses):
+            if response.error:
+                logger.error(f'{self.logger_header}Sensor [{sensor_obj.seq_id}] spawn failure: [{response.error}]')
+                # the frame barrier must not wait for a sensor that does not exist
+                sensor_obj.save_handler = None
+        spawned = [(s, r.actor_id) for (s, r) in zip(self.sensor_objs, responses) if not r.error]
+        sensor_actors = {a.id: a for a in self.world.get_actors([actor_id for (_, actor_id) in spawned])}
+        for (sensor_obj, actor_id) in spawned:
+            sensor_obj.attach(sensor_actors[actor_id])
+        logger.info(f'{self.logger_header}Spawned [{len(spawned)}/{len(self.sensor_objs)}] sensors')
 
         # wait until ready
         logger.info(f'{self.logger_header}Wait [{runtime.carla_setup_wait_time}] second(s) for setup simulation environment')
@@ -203,53 +521,151 @@ class Job:
         logger.info(f'{self.logger_header}Start execute')
 
         # calculate replay time
-        replay_times = list()
         total_t = self.scenario_info.time_end - self.scenario_info.time_start
         delta_t = total_t / (runtime.carla_sim_max_count + 1)
-        current_t = self.scenario_info.time_start
-        for i in range(runtime.carla_sim_max_count):
-            current_t = current_t + delta_t + random.uniform(-1.0 * runtime.carla_sim_time_random, runtime.carla_sim_time_random)
-            replay_times.append(current_t)
-        logger.info(f'{self.logger_header}Replay sequence (length:{len(replay_times)}) set to: [{replay_times}]')
+        rng = numpy.random.default_rng(self.random_seed)
+        jitter = rng.uniform(-1.0 * runtime.carla_sim_time_random, runtime.carla_sim_time_random, size=runtime.carla_sim_max_count)
+        replay_times = (self.scenario_info.time_start + numpy.cumsum(delta_t + jitter)).tolist()
+        logger.info(f'{self.logger_header}Replay sequence (length:{len(replay_times)}, seed:{self.random_seed}) set to: [{replay_times}]')
+
+        # keep the seed with the dataset so a run can be reproduced
+        with open(os.path.join(self.output_directory_path, 'meta.yaml'), 'w', encoding='utf8') as f:
+            yaml.safe_dump({'seed': self.random_seed, 'replay_times': replay_times}, f)
+
+        # in synchronous mode the server idles between ticks, so the scenario is settled by ticking instead of sleeping
+        fixed_delta = runtime.carla_fixed_delta_time
+        settle_ticks = max(0, int(round(runtime.carla_sim_step_wait_scenario_time / fixed_delta)))
 
         # main loop
         counter = 0
         max_counter = runtime.carla_sim_max_count
         while counter < max_counter:
-            if counter == 0:
-                for s in self.sensor_objs:
-                    s.start_recording()
             counter += 1
 
-            # update scenario
-            self.client.replay_file(self.scenario_info.record_path, replay_times[counter-1], 0.1, self.scenario_info.ego_vehicle_actor_id, False)
-            time.sleep(runtime.carla_sim_step_wait_scenario_time)
+            # update scenario, the recording is played into the sample time while models and textures stream in
+            # fewer settle ticks near the start of the recording, the replay cannot start before 0
+            replay_time = replay_times[counter-1]
+            sample_settle_ticks = max(0, min(settle_ticks, int(replay_time / fixed_delta)))
+            replay_start = max(0.0, replay_time - sample_settle_ticks * fixed_delta)
+            # the first tick jumps to replay_start, the capture tick lands one step after replay_time
+            replay_duration = (sample_settle_ticks + 2) * fixed_delta
+            self.client.replay_file(self.scenario_info.record_path, replay_start, replay_duration, self.scenario_info.ego_vehicle_actor_id, False)
+            self.world.tick()
+            self._drop_sensor_data()
+            for _ in range(sample_settle_ticks):
+                self.world.tick()
+                self._drop_sensor_data()
 
             # collect sensor data
             logger.info(f'{self.logger_header}[{counter}/{max_counter}] Collecting sensor data.')
-            for s in self.sensor_objs:
-                s.record_this()
-
-            # self.world.tick()
-            time.sleep(runtime.carla_sim_step_wait_record_time)
-
-        # stop recording
-        for s in self.sensor_objs:
-            s.stop_recording()
+            frame = self.world.tick()
+            self._collect_sensor_data(frame)
 
         # end func
         logger.success(f'{self.logger_header}Job completed.')
         return self
+
+    def _drop_sensor_data(self):
+        # data of ticks that are not sampled, released right away instead of piling up until the next sample
+        for s in self.sensor_objs:
+            try:
+                while True:
+                    s.data_queue.get_nowait()
+            except queue.Empty:
+                pass
+
+    def _collect_sensor_data(self, frame):
+        # block until every sensor delivered the given frame, frames of earlier ticks are dropped
+        for s in self.sensor_objs:
+            if s.save_handler is None:
+                continue
+            while True:
+                try:
+                    data = s.data_queue.get(timeout=runtime.carla_sim_step_wait_record_time)
+                except queue.Empty:
+                    logger.error(f'{self.logger_header}Frame [{frame}] missing data from sensor [{s.seq_id}]')
+                    break
+                if data.frame < frame:
+                    continue
+                if data.frame == frame:
+                    s.save_handler(data)
+                else:
+                    logger.error(f'{self.logger_header}Frame [{frame}] skipped by sensor [{s.seq_id}], got frame [{data.frame}]')
+                break
+
+    def _setup_staging(self, scenario_bytes: int):
+        self._staging_directory_path = None
+        if not runtime.io_staging_directory:
+            return
+        staging_root = staging_root_path()
+        os.makedirs(staging_root, exist_ok=True)
+        # fall back to direct writes when the staging file system could overrun, raw frame sizes are an upper bound
+        free_bytes = shutil.disk_usage(staging_root).free
+        if free_bytes < scenario_bytes:
+            logger.warning(f'{self.logger_header}Staging directory [{staging_root}] has only [{free_bytes}] of [{scenario_bytes}] bytes free, writes go to the output directory directly')
+            return
+        staging_path = os.path.join(staging_root, self.name, self.scenario_info.name)
+        if os.path.isdir(staging_path):
+            shutil.rmtree(staging_path)
+        os.makedirs(staging_path)
+        self._staging_directory_path = staging_path
+        logger.info(f'{self.logger_header}Staging directory set to: [{staging_path}]')
+
+    def wait_staging_move(self):
+        if self._staging_mover is not None:
+            self._staging_mover.join()
+            self._staging_mover = None
+
+    def _enter_sync_mode(self):
+        # reuses the settings fetched in setup(), only the two mode fields change
+        self.world_settings.synchronous_mode = True
+        self.world_settings.fixed_delta_seconds = runtime.carla_fixed_delta_time
+        self.world.apply_settings(self.world_settings)
+        logger.info(f'{self.logger_header}Synchronous mode enabled with fixed delta: [{runtime.carla_fixed_delta_time}]')
+
+    def _exit_sync_mode(self):
+        self.world_settings.synchronous_mode = False
+        self.world_settings.fixed_delta_seconds = None
+        self.world.apply_settings(self.world_settings)
+        logger.info(f'{self.logger_header}Synchronous mode disabled')
     
     def clean(self):
+        # also runs after a failed setup() or exec(), every step only undoes what was set up
         time.sleep(runtime.carla_setup_wait_time)
-        sensor_actors = list()
+        try:
+            sensor_actors = list()
+            for s in self.sensor_objs:
+                if s.sensor_actor is None:
+                    continue
+                sensor_actors.append(s.sensor_actor)
+                s.sensor_actor.stop()
+            if sensor_actors:
+                self.client.apply_batch([carla.command.DestroyActor(x) for x in sensor_actors])
+            if self.world_settings is not None:
+                self._exit_sync_mode()
+        except RuntimeError as e:
+            logger.error(f'{self.logger_header}Release simulation failure: [{e}]')
+        # flush pending writes before the next job reuses the output tree
+        logger.info(f'{self.logger_header}Wait for pending sensor data writes')
+        if self.writer is not None:
+            self.writer.shutdown(wait=True)
+            self.writer = None
+        # the encoder stays up for the next job, closing the buffer pools waits for this job's images
+        self.encoder = None
         for s in self.sensor_objs:
-            sensor_actors.append(s.sensor_actor)
-            s.sensor_actor.stop()
-        self.client.apply_batch([carla.command.DestroyActor(x) for x in sensor_actors])
+            if s.buffer_pool is not None:
+                s.buffer_pool.close()
+        # move staged files while the next scenario is set up, one move in flight per job
+        if self._staging_directory_path is not None:
+            self.wait_staging_move()
+            self._staging_mover = threading.Thread(target=move_staged_output, args=(self._staging_directory_path, self.output_directory_path, self.logger_header), name=f'mover-{self.name}')
+            self._staging_mover.start()
+            self._staging_directory_path = None
         self.client = None
         self.world = None
+        self.blueprint_library = None
+        self.blueprint_cache = dict()
+        self.world_settings = None
         self.vehicle_actor = None
         self.sensor_objs = list()
         time.sleep(runtime.carla_setup_wait_time)
@@ -264,42 +680,129 @@ class JobYamlLoader:
         if not os.path.exists(load_path):
             logger.error(f'{self.logger_header}Input Error: Directory [{load_path}] not exists.')
             return job_list
-        yaml_files = query(os.listdir(load_path)).where(lambda i: i.endswith('.yaml')).to_list()
-        if not any(yaml_files):
+        # scandir carries the file type from the directory listing, no extra stat per entry
+        with os.scandir(load_path) as entries:
+            yaml_files = [i.path for i in entries if i.name.endswith('.yaml') and i.is_file()]
+        if not yaml_files:
             logger.error(f'{self.logger_header}Input Error: No available YAML config files.')
             return job_list
-        for yaml_file in yaml_files:
-            yaml_file_abspath = os.path.join(load_path, yaml_file)
-            logger.info(f'{self.logger_header}Found yaml file: [{yaml_file_abspath}]')
-            with open(yaml_file_abspath, 'r', encoding='utf8') as f:
-                yaml_data = yaml.load(f, Loader=yaml.FullLoader)
-            # create jobs
-            job_name = yaml_file.replace('.yaml', '')
-            logger.info(f'{self.logger_header}Creating new job: [{job_name}]')
-            try:
-                sensor_info_list = list()
-                for yaml_sensor_info in yaml_data:
-                    blueprint_name = yaml_sensor_info['blueprint_name']
-                    yaml_transform = yaml_sensor_info['transform']
-                    transform = carla.Transform(
-                        carla.Location(yaml_transform['x'], yaml_transform['y'], yaml_transform['z']),
-                        carla.Rotation(yaml_transform['pitch'], yaml_transform['yaw'], yaml_transform['roll'])
-                    )
-                    sensor_info = SensorInfo(blueprint_name, transform)
-                    if yaml_sensor_info['attribute']:
-                        sensor_info.attribute = yaml_sensor_info['attribute']
-                    sensor_info_list.append(sensor_info)
-                    logger.info(f'{self.logger_header}Load sensor: [{blueprint_name}]')
-            except IndexError:
-                logger.error(f'{self.logger_header}Decode Error: Broken YAML file [{yaml_file_abspath}]')
-                continue
-            except KeyError:
-                logger.error(f'{self.logger_header}Decode Error: Broken YAML file [{yaml_file_abspath}]')
-                continue
-            job = Job(job_name, sensor_info_list)
-            job_list.append(job)
-            logger.success(f'{self.logger_header}Successfully loading job: [{job_name}]')
+        # read and parse the files concurrently, map() keeps the directory order
+        with ThreadPoolExecutor(max_workers=min(len(yaml_files), os.cpu_count() or 1)) as loader_pool:
+            for job in loader_pool.map(self.load_one, yaml_files):
+                if job is not None:
+                    job_list.append(job)
         return job_list
+
+    def load_one(self, yaml_file_abspath):
+        logger.info(f'{self.logger_header}Found yaml file: [{yaml_file_abspath}]')
+        with open(yaml_file_abspath, 'rb') as f:
+            yaml_data = yaml.load(f, Loader=YamlLoader)
+        # create jobs
+        job_name = os.path.basename(yaml_file_abspath).replace('.yaml', '')
+        logger.info(f'{self.logger_header}Creating new job: [{job_name}]')
+        try:
+            sensor_info_list = list()
+            for yaml_sensor_info in yaml_data:
+                blueprint_name = yaml_sensor_info['blueprint_name']
+                yaml_transform = yaml_sensor_info['transform']
+                transform = carla.Transform(
+                    carla.Location(yaml_transform['x'], yaml_transform['y'], yaml_transform['z']),
+                    carla.Rotation(yaml_transform['pitch'], yaml_transform['yaw'], yaml_transform['roll'])
+                )
+                sensor_info = SensorInfo(blueprint_name, transform)
+                if yaml_sensor_info['attribute']:
+                    sensor_info.attribute = {str(k): str(v) for (k, v) in yaml_sensor_info['attribute'].items()}
+                sensor_info_list.append(sensor_info)
+                logger.info(f'{self.logger_header}Load sensor: [{blueprint_name}]')
+        except IndexError:
+            logger.error(f'{self.logger_header}Decode Error: Broken YAML file [{yaml_file_abspath}]')
+            return None
+        except KeyError:
+            logger.error(f'{self.logger_header}Decode Error: Broken YAML file [{yaml_file_abspath}]')
+            return None
+        job = Job(job_name, sensor_info_list, yaml_file_abspath)
+        logger.success(f'{self.logger_header}Successfully loading job: [{job_name}]')
+        return job
+# endregion
+
+
+# region Functions
+def setup_logger():
+    logger.remove()
+    logger.add(sys.stdout, 
+        colorize=True, 
+        format=runtime.app_loguru_format,
+        level=runtime.app_loguru_level)
+
+def get_shared_encoder() -> ProcessPoolExecutor:
+    # starting encoder processes imports cv2/numpy in each of them, so they are reused across jobs
+    # spawned, not forked: the first job already holds a carla.Client with RPC threads and sockets
+    global _shared_encoder
+    if _shared_encoder is None:
+        _shared_encoder = ProcessPoolExecutor(max_workers=runtime.io_encoder_max_workers, mp_context=multiprocessing.get_context('spawn'), initializer=pin_to_cpus, initargs=(runtime.io_writer_cpus,))
+    return _shared_encoder
+
+def shutdown_shared_encoder():
+    global _shared_encoder
+    if _shared_encoder is not None:
+        _shared_encoder.shutdown(wait=True)
+        _shared_encoder = None
+
+def staging_root_path() -> str:
+    # per process, parallel workers stage into separate folders
+    return os.path.join(os.path.abspath(runtime.io_staging_directory), f'carla_{os.getpid()}')
+
+def remove_staging_root():
+    # called once all staged moves are done, only empty folders are removed so failed moves keep their data
+    if not runtime.io_staging_directory:
+        return
+    for (dir_path, _, _) in os.walk(staging_root_path(), topdown=False):
+        try:
+            os.rmdir(dir_path)
+        except OSError:
+            pass
+
+def read_record_world_name(client: carla.Client, record_path: str) -> str:
+    # the server parses the whole record file, only the map line of the header is used
+    return client.show_recorder_file_info(record_path, False).splitlines()[1].replace('Map: ', '')
+
+def run_job(job: Job, scenario_infos: list):
+    for scenario_info in scenario_infos:
+        job.bind_scenario_info(scenario_info)
+        try:
+            job.setup()
+            job.exec()
+        except Exception as e:
+            # the world may still hold the state of the failed scenario, the next task on this server reloads the map
+            _loaded_record_paths.pop((runtime.carla_ip_addr, runtime.carla_port), None)
+            # a dead encoder process breaks the shared pool for good, the next setup() starts a fresh one
+            if isinstance(e, BrokenProcessPool):
+                shutdown_shared_encoder()
+            raise
+        finally:
+            job.clean()
+
+def _init_worker(runtime_values: dict, port_queue):
+    # worker processes do not share module globals, so runtime is handed over explicitly
+    for (key, value) in runtime_values.items():
+        setattr(runtime, key, value)
+    runtime.carla_port = port_queue.get()
+    # the shared encoder must be shut down before multiprocessing joins its child processes at worker exit
+    multiprocessing.util.Finalize(None, shutdown_shared_encoder, exitpriority=10)
+    # every task of the worker waits for its staged moves, so the worker's staging folders are empty at exit
+    multiprocessing.util.Finalize(None, remove_staging_root, exitpriority=10)
+    setup_logger()
+    logger.info(f'Worker [{os.getpid()}] connects to CARLA server port: [{runtime.carla_port}]')
+
+def _run_job_worker(config_path: str, scenario_info: ScenarioInfo):
+    # carla objects inside Job are not picklable, the worker reloads its job from the config file
+    job = JobYamlLoader().load_one(config_path)
+    if job is not None:
+        try:
+            run_job(job, [scenario_info])
+        finally:
+            # clean() starts the move also for a failed task, it must finish before the staging root is removed
+            job.wait_staging_move()
 # endregion
 
 
@@ -309,13 +812,17 @@ if __name__=='__main__':
     # setup argparse
     parser = argparse.ArgumentParser(description=text.argparse_description, epilog=text.argparse_epilog, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('--carla-ip-addr', type=str, help=text.argparse_carla_ip_addr, default=runtime.carla_ip_addr)
-    parser.add_argument('--carla-port', type=int, help=text.argparse_carla_port, default=runtime.carla_port)
+    parser.add_argument('--carla-port', type=int, nargs='+', help=text.argparse_carla_port, default=runtime.carla_ports)
     parser.add_argument('-i', '--input', type=str, help=text.argparse_input, default=runtime.io_input_directory)
     parser.add_argument('-o', '--output', type=str, help=text.argparse_output, default=runtime.io_output_directory)
+    parser.add_argument('--staging', type=str, help=text.argparse_staging, default=runtime.io_staging_directory)
+    parser.add_argument('--image-format', type=str, choices=['png', 'jpg'], help=text.argparse_image_format, default=runtime.io_image_format)
+    parser.add_argument('--writer-cpus', type=int, nargs='+', help=text.argparse_writer_cpus, default=runtime.io_writer_cpus)
     parser.add_argument('-c', '--count', type=int, help=text.argparse_count, default=runtime.carla_sim_max_count)
     parser.add_argument('-s', '--wait-scenario', type=float, help=text.argparse_wait_scenario, default=runtime.carla_sim_step_wait_scenario_time)
     parser.add_argument('-r', '--wait-record', type=float, help=text.argparse_wait_record, default=runtime.carla_sim_step_wait_record_time)
     parser.add_argument('--random', type=float, help=text.argparse_random, default=runtime.carla_sim_time_random)
+    parser.add_argument('--seed', type=int, help=text.argparse_seed, default=runtime.carla_sim_random_seed)
     parser.add_argument('--log', type=str, help=text.argparse_help_none, default=runtime.app_loguru_level)
     
     # setup runtimes
@@ -323,24 +830,33 @@ if __name__=='__main__':
     runtime.app_root_path = os.path.abspath(os.path.dirname(__file__))
     runtime.app_loguru_level = args.log
     runtime.carla_ip_addr = args.carla_ip_addr
-    runtime.carla_port = args.carla_port
+    runtime.carla_ports = args.carla_port
+    runtime.carla_port = args.carla_port[0]
     runtime.io_input_directory = os.path.join(runtime.app_root_path, os.path.normpath(args.input))
     runtime.io_output_directory = os.path.join(runtime.app_root_path, os.path.normpath(args.output))
+    runtime.io_staging_directory = args.staging
+    runtime.io_image_format = args.image_format
+    runtime.io_writer_cpus = args.writer_cpus
+    if runtime.io_writer_cpus and not hasattr(os, 'sched_setaffinity'):
+        logger.warning('CPU pinning of writers is only supported on Linux, --writer-cpus is ignored')
+    elif runtime.io_writer_cpus:
+        # an invalid core would break the writer pools at their first frame, so it is rejected here
+        invalid_cpus = sorted(set(runtime.io_writer_cpus) - os.sched_getaffinity(0))
+        if invalid_cpus:
+            logger.error(f'Input Error: --writer-cpus [{invalid_cpus}] not available to this process, available: [{sorted(os.sched_getaffinity(0))}]')
+            exit(1)
     runtime.carla_sim_max_count = args.count
     runtime.carla_sim_step_wait_scenario_time = args.wait_scenario
     runtime.carla_sim_step_wait_record_time = args.wait_record
     runtime.carla_sim_time_random = args.random
+    runtime.carla_sim_random_seed = args.seed
     # log args decode and runtime setup complete
     logger.success('Runtime loads complete.')
     # endregion
 
     # region Application Setup
     # setup logger
-    logger.remove()
-    logger.add(sys.stdout, 
-        colorize=True, 
-        format=runtime.app_loguru_format,
-        level=runtime.app_loguru_level)
+    setup_logger()
     
     # log app start to confirm entry
     logger.success('Application start.')
@@ -355,14 +871,31 @@ if __name__=='__main__':
     
     # start exec jobs
     logger.success('='*20 + 'BEGIN JOB EXEC' + '='*20)
-    for job in loaded_jobs:
-        for scenario_info in loaded_scenario_infos:
-            job.bind_scenario_info(scenario_info)
-            if not isinstance(job, Job):
-                continue
-            job.setup()
-            job.exec()
-            job.clean()
+    # every (job, scenario) pair is independent, pairs of a scenario run back to back so its map is loaded once
+    tasks = [(job, scenario_info) for scenario_info in loaded_scenario_infos for job in loaded_jobs]
+    worker_count = min(len(tasks), len(runtime.carla_ports))
+    if worker_count <= 1:
+        for (job, scenario_info) in tasks:
+            try:
+                run_job(job, [scenario_info])
+            except Exception as e:
+                logger.error(f'Job [{job.name} / {scenario_info.name}]: Execution failure: [{e}]')
+        for job in loaded_jobs:
+            job.wait_staging_move()
+        remove_staging_root()
+        shutdown_shared_encoder()
+    else:
+        # one worker process per CARLA server, each worker owns its port for its whole lifetime
+        logger.info(f'Run [{len(tasks)}] job scenarios on [{worker_count}] CARLA servers: [{runtime.carla_ports[:worker_count]}]')
+        port_queue = multiprocessing.Queue()
+        for port in runtime.carla_ports[:worker_count]:
+            port_queue.put(port)
+        runtime_values = {k: v for (k, v) in vars(runtime).items() if not k.startswith('__')}
+        with ProcessPoolExecutor(max_workers=worker_count, initializer=_init_worker, initargs=(runtime_values, port_queue)) as pool:
+            futures = {pool.submit(_run_job_worker, job.config_path, scenario_info): f'{job.name} / {scenario_info.name}' for (job, scenario_info) in tasks}
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    logger.error(f'Job [{futures[future]}]: Execution failure: [{future.exception()}]')
 
     logger.success('='*20 + 'FINISH JOB EXEC' + '='*20)
     logger.success('DONE.')
@@ -5,14 +5,26 @@ app_loguru_next_line = '\n' + ' ' * 42
 
 io_input_directory = './input'
 io_output_directory = './output'
+io_writer_max_workers = 4
+io_encoder_max_workers = 4
+io_writer_cpus = []
+io_png_compression = 1
+io_image_format = 'png'
+io_jpeg_quality = 90
+io_buffer_pool_slots = 4
+io_staging_directory = ''
 
 carla_ip_addr = '127.0.0.1'
 carla_port = 2000
+carla_ports = [carla_port]
+carla_client_timeout = 20.0
 carla_setup_wait_time = 2.0
+carla_fixed_delta_time = 0.05
 
 carla_sim_step_wait_scenario_time = 1.0
 carla_sim_step_wait_record_time = 1.0
 carla_sim_max_count = 20
 carla_sim_time_random = 0.0
+carla_sim_random_seed = 0
 
 scenario_config_filepath = './scenario.yaml'
\ No newline at end of file
@@ -3,18 +3,22 @@ The CARLA Sensor Configuration Iterator is an open-source programme that allows
 """
 argparse_help_none = "*"*20
 argparse_carla_ip_addr = "Carla server's IP address in IPv4"
-argparse_carla_port = "Carla server's port"
+argparse_carla_port = "Carla server's port. Give several ports of running Carla servers to execute the scenarios of all jobs in parallel, one scenario per server at a time"
 argparse_input = "Input directory. The sensor configuration files in YAML format need to be stored in this directory"
 argparse_output = "Output directory. The dataset will be generated to this directory"
+argparse_image_format = "Image format of RGB cameras. jpg encodes much faster and gives smaller files but is lossy. Depth and segmentation cameras are always saved as png"
+argparse_writer_cpus = "(Linux only) CPU cores the writer threads and image encoder processes are pinned to, e.g. 0 1 2 3. By default they run on any core"
+argparse_staging = "Staging directory on a memory backed file system (e.g. /dev/shm). Sensor data is written there first and moved to the output directory after every scenario. Leave empty to write to the output directory directly"
 argparse_demo = "Run pre-coded demo with 1 job and 3 sensors"
 argparse_r_min = "Minimum radius value of the random zone"
 argparse_r_max = "Maximum radius value of the random zone"
 argparse_count = "Number of randomised trials executed per Job"
 argparse_delta_t = "PLEASE READ THE README! Interval between each collection in Job"
 argparse_log = "Log level of the program"
-argparse_wait_scenario = "The time program waits for the CARLA emulator to load scenario slice. If you are experiencing LOD problems (Models and textures do not load as expected), you can increase this value appropriately. Instead you can decrease this value to get a smaller execution time"
-argparse_wait_record = "The time program waits for the CARLA emulator to save image (`.png`) or pointcloud (`.pcd`) data to disk. If the number of your data is incorrect or the data content is missing or corrupted, you can increase this value appropriately. Instead you can decrease this value to get a smaller execution time"
+argparse_wait_scenario = "The simulation time (in seconds, rounded to simulation steps) the scenario is played before every sample so the CARLA emulator can load the scenario slice. If you are experiencing LOD problems (Models and textures do not load as expected), you can increase this value appropriately. Instead you can decrease this value to get a smaller execution time"
+argparse_wait_record = "The maximum time program waits for every sensor to deliver the data of a simulation step. If you see errors about missing sensor data, you can increase this value appropriately. It only takes effect when a sensor is late, so it does not slow down normal execution"
 argparse_random = "This value indicates the randomness of the sampling time point when slicing the scenario"
+argparse_seed = "Base seed of the random sampling. The same seed, job and scenario always give the same sampling time points"
 
 argparse_epilog = """
 GITHUB: https://github.com/ZHAO-Zirui/CARLA-Sensor-Configuration-Iterator.git